@@ -8,16 +8,46 @@ import csv
 import math
 import sys
 import os
+import struct
+import threading
+import time
 import traceback
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Dict, List, Any, Tuple
-
-import serial_asyncio  # pyserial-asyncio
-from pyubx2 import UBXReader, UBXMessage  # type: ignore
-
-
-@dataclass
+from typing import Callable, Optional, Dict, List, Any, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+import pandas as pd  # type: ignore
+import serial  # type: ignore
+from pyubx2 import UBXReader, UBXMessage, SET_LAYER_RAM, TXN_NONE  # type: ignore
+
+try:
+    from numba import njit  # type: ignore
+except ImportError:  # numba is optional, NumPy reductions are used without it
+    njit = None
+
+# Repeating blocks of the messages we accumulate, laid out as in the F9T
+# interface description. Unpacking msg.payload directly skips pyubx2's
+# per-field "name_NN" attributes, which cost an f-string and a getattr each.
+NAV_HDR_LEN = 8  # iTOW, version, numSvs/numSigs, reserved
+NAV_SAT_DTYPE = np.dtype([
+    ("gnssId", "u1"), ("svId", "u1"), ("cno", "u1"), ("elev", "i1"),
+    ("azim", "<i2"), ("prRes", "<i2"), ("flags", "<u4"),
+])
+NAV_SIG_BLOCK = struct.Struct("<BBBBhBBBBH4x")  # gnssId svId sigId freqId prRes cno qualityInd corrSource ionoModel sigFlags
+RXM_MEASX_HDR_LEN = 44
+RXM_MEASX_BLOCK = struct.Struct("<BB22x")  # gnssId svId, rest unused
+# pyubx2 names repeating-group fields name_01..name_NN; numSv is U1 so 255 covers any message
+HALF_CYC_ATTRS = tuple(f"halfCyc_{i:02d}" for i in range(1, 256))
+UBX_SYNC = b"\xb5\x62"
+PR_RES_SCALE = 0.1  # NAV-SAT/NAV-SIG prRes is I2 in units of 0.1 m
+
+# NAV-SAT elevation is whole degrees, so sin(elev) is a table lookup at SIN_ELEV[elev + 90]
+SIN_ELEV = np.sin(np.radians(np.arange(-90, 91)))
+
+
+@dataclass(slots=True)
 class SatSample:
     gnssId: int
     svId: int
@@ -28,7 +58,7 @@ class SatSample:
     hasMultipathFlag: bool
 
 
-@dataclass
+@dataclass(slots=True)
 class SigSample:
     gnssId: int
     svId: int
@@ -40,7 +70,7 @@ class SigSample:
     sigId: int = 0  # Signal ID from NAV-SIG
 
 
-@dataclass
+@dataclass(slots=True)
 class EpochFeatures:
     label: str
     utcTowMs: int
@@ -56,12 +86,90 @@ class EpochFeatures:
     noSlipFrac: float
 
 
+# (numTracked, meanCn0, fracAbove70, elevWeightedCoverage, meanAbsPrRes, highElevCn0Std)
+SatAggregates = Tuple[int, float, float, float, float, float]
+
+
+def aggSatsLoop(cn0: NDArray[np.float64], elev: NDArray[np.float64], prRes: NDArray[np.float64]) -> SatAggregates:
+    # Every NAV-SAT aggregate in one pass, written for numba to compile
+    numTracked = 0
+    cn0Sum = 0.0
+    numAbove70 = 0
+    num = 0.0
+    prResSum = 0.0
+    numPrRes = 0
+    highSum = 0.0
+    highSqSum = 0.0
+    numHigh = 0
+    for i in range(cn0.size):
+        c = cn0[i]
+        e = elev[i]
+        if c > 0.0:
+            numTracked += 1
+            cn0Sum += c
+            # elevation-weighted coverage proxy: sum(cn0 * sin(elev)) / sum(cn0)
+            num += c * SIN_ELEV[int(e) + 90]
+            if e >= 70.0:
+                numAbove70 += 1
+            if e >= 45.0:
+                highSum += c
+                highSqSum += c * c
+                numHigh += 1
+        pr = prRes[i]
+        if math.isfinite(pr):
+            prResSum += abs(pr)
+            numPrRes += 1
+    mu = highSum / max(1, numHigh)
+    var = highSqSum / max(1, numHigh) - mu * mu
+    return (
+        numTracked,
+        cn0Sum / max(1, numTracked),
+        numAbove70 / max(1, numTracked),
+        num / cn0Sum if cn0Sum > 0.0 else 0.0,
+        prResSum / max(1, numPrRes),
+        math.sqrt(max(0.0, var)),
+    )
+
+
+def aggSatsNumpy(cn0: NDArray[np.float64], elev: NDArray[np.float64], prRes: NDArray[np.float64]) -> SatAggregates:
+    # Same aggregates as aggSatsLoop as masked NumPy reductions, for when numba is missing
+    tracked = cn0 > 0.0
+    numTracked = int(np.count_nonzero(tracked))
+    trackedCn0 = cn0[tracked]
+    trackedElev = elev[tracked]
+    cn0Sum = float(trackedCn0.sum())
+    num = float((trackedCn0 * SIN_ELEV[trackedElev.astype(np.intp) + 90]).sum())
+    prResVals = np.abs(prRes[np.isfinite(prRes)])
+    highElevCn0Vals = trackedCn0[trackedElev >= 45.0]
+    return (
+        numTracked,
+        cn0Sum / max(1, numTracked),
+        int(np.count_nonzero(trackedElev >= 70.0)) / max(1, numTracked),
+        num / cn0Sum if cn0Sum > 0.0 else 0.0,
+        float(prResVals.sum()) / max(1, prResVals.size),
+        float(highElevCn0Vals.std()) if highElevCn0Vals.size > 0 else 0.0,
+    )
+
+
+# fastmath is left off since it would let LLVM assume prRes is never NaN and drop the isfinite test
+aggSats: Callable[[NDArray[np.float64], NDArray[np.float64], NDArray[np.float64]], SatAggregates] = (
+    njit(cache=True)(aggSatsLoop) if njit is not None else aggSatsNumpy
+)
+
+
 class UbxEpochAccumulator:
     def __init__(self, label: str) -> None:
         self.label = label
         self.currentItow: Optional[int] = None
         self.satSamples: List[SatSample] = []
+        # NAV-SAT columns used by buildFeatures, kept as arrays so it can reduce them in C
+        self.satCn0: NDArray[np.float64] = np.empty(0)
+        self.satElev: NDArray[np.float64] = np.empty(0)
+        self.satPrRes: NDArray[np.float64] = np.empty(0)
+        self.elevBySv: Dict[Tuple[int, int], float] = {}
         self.sigSamples: List[SigSample] = []
+        # bit freqId is set for each frequency an SV was heard on this epoch
+        self.freqIdsBySv: Dict[Tuple[int, int], int] = {}
         self.latestPdop: Optional[float] = None
         self.latestTdop: Optional[float] = None
 
@@ -74,29 +182,27 @@ class UbxEpochAccumulator:
             pass
 
         # msg has a repeating block with numSvs entries
-        self.satSamples.clear()
         numSvs = int(msg.numSvs)
-        for i in range(1, numSvs + 1):
-            gnssId = int(getattr(msg, f"gnssId_{i:02d}"))
-            svId = int(getattr(msg, f"svId_{i:02d}"))
-            elevDeg = float(getattr(msg, f"elev_{i:02d}"))
-            azimDeg = float(getattr(msg, f"azim_{i:02d}"))
-            cn0 = float(getattr(msg, f"cno_{i:02d}"))
-            prRes = float(getattr(msg, f"prRes_{i:02d}")) if hasattr(msg, f"prRes_{i:02d}") else float("nan")
-
-            # Multipath information is no longer available in NAV-SAT with pyubx2
-            # It's now in RXM-MEASX messages
-            self.satSamples.append(
-                SatSample(
-                    gnssId=gnssId,
-                    svId=svId,
-                    elevDeg=elevDeg,
-                    azimDeg=azimDeg,
-                    cn0=cn0,
-                    prRes=prRes,
-                    hasMultipathFlag=False,  # No longer available in NAV-SAT
-                )
+        sats = np.frombuffer(msg.payload, dtype=NAV_SAT_DTYPE, count=numSvs, offset=NAV_HDR_LEN)
+        self.satCn0 = sats["cno"].astype(np.float64)
+        # Clipped so a corrupt elevation can't index outside SIN_ELEV
+        self.satElev = np.clip(sats["elev"], -90, 90).astype(np.float64)
+        self.satPrRes = sats["prRes"] * PR_RES_SCALE
+        # Multipath information is no longer available in NAV-SAT with pyubx2
+        # It's now in RXM-MEASX messages
+        self.satSamples = [
+            SatSample(
+                gnssId=gnssId,
+                svId=svId,
+                elevDeg=float(elevDeg),
+                azimDeg=float(azimDeg),
+                cn0=float(cn0),
+                prRes=prRes * PR_RES_SCALE,
+                hasMultipathFlag=False,  # No longer available in NAV-SAT
             )
+            for gnssId, svId, cn0, elevDeg, azimDeg, prRes, _flags in sats.tolist()
+        ]
+        self.elevBySv = {(s.gnssId, s.svId): s.elevDeg for s in self.satSamples}
 
     def onNavDop(self, msg: Any) -> None:
         # UBX-NAV-DOP has gdop, pdop, tdop, etc. scaled by 0.01
@@ -108,44 +214,32 @@ class UbxEpochAccumulator:
         itow = int(msg.iTOW)
         if self.currentItow is None:
             self.currentItow = itow
-        # Clear sigSamples when we get a new NAV-SIG (start of signal epoch)
-        self.sigSamples.clear()
+        # A new NAV-SIG replaces the signal epoch wholesale
+        self.freqIdsBySv.clear()
 
         numSigs = int(msg.numSigs)
-        for i in range(1, numSigs + 1):
-            gnssId = int(getattr(msg, f"gnssId_{i:02d}"))
-            svId = int(getattr(msg, f"svId_{i:02d}"))
-            sigId = int(getattr(msg, f"sigId_{i:02d}"))
-            freqId = int(getattr(msg, f"freqId_{i:02d}"))
-            cn0 = float(getattr(msg, f"cno_{i:02d}"))
-
-            # Quality indicators from NAV-SIG
-            qualityInd = int(getattr(msg, f"qualityInd_{i:02d}")) if hasattr(msg, f"qualityInd_{i:02d}") else 0
-            # Quality >= 4 generally means code and carrier lock
-            hasLock = qualityInd >= 4
-
-            # Cycle slip will come from RXM-MEASX, default to False here
-            hasCycleSlip = False
-
-            # Attach elevation from NAV-SAT snapshot
-            elevDeg: Optional[float] = None
-            for s in self.satSamples:
-                if s.gnssId == gnssId and s.svId == svId:
-                    elevDeg = s.elevDeg
-                    break
-
-            self.sigSamples.append(
-                SigSample(
-                    gnssId=gnssId,
-                    svId=svId,
-                    freqId=freqId,
-                    cn0=cn0,
-                    hasLock=hasLock,
-                    hasCycleSlip=hasCycleSlip,
-                    elevDeg=elevDeg,
-                    sigId=sigId,
-                )
+        blocks = msg.payload[NAV_HDR_LEN:NAV_HDR_LEN + numSigs * NAV_SIG_BLOCK.size]
+        sigBlocks = list(NAV_SIG_BLOCK.iter_unpack(blocks))
+        for gnssId, svId, _sigId, freqId, *_ in sigBlocks:
+            key = (gnssId, svId)
+            self.freqIdsBySv[key] = self.freqIdsBySv.get(key, 0) | (1 << freqId)
+
+        # Quality >= 4 generally means code and carrier lock. Cycle slip will come
+        # from RXM-MEASX, default to False here. Elevation is from the NAV-SAT snapshot.
+        elevBySv = self.elevBySv
+        self.sigSamples = [
+            SigSample(
+                gnssId=gnssId,
+                svId=svId,
+                freqId=freqId,
+                cn0=float(cno),
+                hasLock=qualityInd >= 4,
+                hasCycleSlip=False,
+                elevDeg=elevBySv.get((gnssId, svId)),
+                sigId=sigId,
             )
+            for gnssId, svId, sigId, freqId, _prRes, cno, qualityInd, *_ in sigBlocks
+        ]
 
     def onRxmMeasx(self, msg: Any) -> None:
         # UBX-RXM-MEASX provides cycle slip and multipath indicators
@@ -155,15 +249,11 @@ class UbxEpochAccumulator:
             self.currentItow = itow
 
         numSv = int(msg.numSv)
-        for i in range(1, numSv + 1):
-            gnssId = int(getattr(msg, f"gnssId_{i:02d}"))
-            svId = int(getattr(msg, f"svId_{i:02d}"))
-
+        blocks = msg.payload[RXM_MEASX_HDR_LEN:RXM_MEASX_HDR_LEN + numSv * RXM_MEASX_BLOCK.size]
+        for i, (gnssId, svId) in enumerate(RXM_MEASX_BLOCK.iter_unpack(blocks)):
             # Check for cycle slip indicators (half cycle ambiguity)
-            hasCycleSlip = False
-            if hasattr(msg, f"halfCyc_{i:02d}"):
-                halfCyc = int(getattr(msg, f"halfCyc_{i:02d}"))
-                hasCycleSlip = bool(halfCyc & 0x01)  # Bit 0 indicates half cycle valid
+            halfCyc = getattr(msg, HALF_CYC_ATTRS[i], None)
+            hasCycleSlip = halfCyc is not None and bool(int(halfCyc) & 0x01)  # Bit 0 indicates half cycle valid
 
             # Update existing sigSample if we have one for this satellite
             for sig in self.sigSamples:
@@ -180,54 +270,30 @@ class UbxEpochAccumulator:
         feat = self.buildFeatures(self.currentItow)
         self.currentItow = incomingItow
         self.satSamples.clear()
+        self.satCn0 = self.satElev = self.satPrRes = np.empty(0)
+        self.elevBySv.clear()
         self.sigSamples.clear()
+        self.freqIdsBySv.clear()
         return feat
 
     def buildFeatures(self, itow: int) -> EpochFeatures:
-        sats = list(self.satSamples)
         sigs = list(self.sigSamples)
-
-        numTracked = len([s for s in sats if s.cn0 > 0.0])
-        meanCn0 = (
-            sum(s.cn0 for s in sats if s.cn0 > 0.0) / max(1, numTracked)
-        )
-
-        highElev = [s for s in sats if s.elevDeg >= 70.0 and s.cn0 > 0.0]
-        fracAbove70 = len(highElev) / max(1, numTracked) if numTracked > 0 else 0.0
-
-        # elevation-weighted coverage proxy: sum(cn0 * sin(elev)) / sum(cn0)
-        num = 0.0
-        den = 0.0
-        for s in sats:
-            if s.cn0 > 0.0:
-                num += s.cn0 * math.sin(math.radians(s.elevDeg))
-                den += s.cn0
-        elevWeightedCoverage = num / den if den > 0.0 else 0.0
-
-        prResVals = [abs(s.prRes) for s in sats if math.isfinite(s.prRes)]
-        meanAbsPrRes = sum(prResVals) / max(1, len(prResVals))
-
-        highElevCn0Vals = [s.cn0 for s in sats if s.elevDeg >= 45.0 and s.cn0 > 0.0]
-        mu = sum(highElevCn0Vals) / max(1, len(highElevCn0Vals))
-        var = sum((x - mu) * (x - mu) for x in highElevCn0Vals) / max(1, len(highElevCn0Vals))
-        highElevCn0Std = math.sqrt(var)
+        (
+            numTracked,
+            meanCn0,
+            fracAbove70,
+            elevWeightedCoverage,
+            meanAbsPrRes,
+            highElevCn0Std,
+        ) = aggSats(self.satCn0, self.satElev, self.satPrRes)
 
         # dual band fraction: unique sats that appear with more than one freqId in this epoch
-        bySv: Dict[Tuple[int, int], set[int]] = {}
-        for g in sigs:
-            key = (g.gnssId, g.svId)
-            if key not in bySv:
-                bySv[key] = set()
-            bySv[key].add(g.freqId)
-        print(f"DEBUG: len(sigs)={len(sigs)}, len(bySv)={len(bySv)}", file=sys.stderr)
-        for k, v in list(bySv.items())[:3]:  # Show first 3 satellites
-            print(f"DEBUG: SV {k} has freqIds: {v}", file=sys.stderr)
-        if len(bySv) == 0:
+        if len(self.freqIdsBySv) == 0:
             dualBandFrac = 0.0
         else:
-            multi = sum(1 for k, v in bySv.items() if len(v) >= 2)
-            print(f"DEBUG: multi={multi}, total={len(bySv)}, dualBandFrac={multi/len(bySv)}", file=sys.stderr)
-            dualBandFrac = multi / len(bySv)
+            # m & (m - 1) clears the lowest set bit, so it is nonzero iff two or more are set
+            multi = sum(1 for m in self.freqIdsBySv.values() if m & (m - 1))
+            dualBandFrac = multi / len(self.freqIdsBySv)
 
         # lock continuity: fraction of signals without slip this epoch
         if len(sigs) == 0:
@@ -252,123 +318,125 @@ class UbxEpochAccumulator:
         )
 
 
-async def initializeReceiver(writer: asyncio.StreamWriter) -> None:
-    """Send UBX-CFG-MSG commands to enable NAV-SAT, NAV-SIG, NAV-DOP, and RXM-MEASX on USB."""
-    # UBX-CFG-MSG format: msgClass, msgID, rate[6 ports: DDC/I2C, UART1, UART2, USB, SPI, reserved]
-    # We want to enable on USB (index 3), so rate array is [0, 0, 0, 1, 0, 0]
+FEATURE_COLUMNS = [
+    "label","utcTowMs","numTracked","meanCn0","fracAbove70",
+    "elevWeightedCoverage","meanAbsPrRes","highElevCn0Std",
+    "dualBandFrac","pdop","tdop","noSlipFrac"
+]
+# One epoch row, formatted as csv.writer did (including its \r\n terminator)
+# but with a single str.format call. pdop/tdop arrive preformatted since they may be None.
+FEATURE_ROW_FMT = "{},{},{},{:.3f},{:.6f},{:.6f},{:.3f},{:.3f},{:.6f},{},{},{:.6f}\r\n"
 
-    # Enable NAV-SAT (0x01, 0x35)
-    cfg_nav_sat = UBXMessage('CFG', 'CFG-MSG', 0, msgClass=0x01, msgID=0x35, rateDDC=0, rateUART1=0, rateUART2=0, rateUSB=1, rateSPI=0, rateRes=0)
-    writer.write(cfg_nav_sat.serialize())
-    await writer.drain()
-    await asyncio.sleep(0.1)
 
-    # Enable NAV-SIG (0x01, 0x43) - provides freqId for dual-band analysis
-    cfg_nav_sig = UBXMessage('CFG', 'CFG-MSG', 0, msgClass=0x01, msgID=0x43, rateDDC=0, rateUART1=0, rateUART2=0, rateUSB=1, rateSPI=0, rateRes=0)
-    writer.write(cfg_nav_sig.serialize())
-    await writer.drain()
-    await asyncio.sleep(0.1)
+def csvField(v: str) -> str:
+    # Quote like csv.writer, only needed for the user supplied label
+    if any(c in v for c in ',"\r\n'):
+        return '"' + v.replace('"', '""') + '"'
+    return v
 
-    # Enable NAV-DOP (0x01, 0x04)
-    cfg_nav_dop = UBXMessage('CFG', 'CFG-MSG', 0, msgClass=0x01, msgID=0x04, rateDDC=0, rateUART1=0, rateUART2=0, rateUSB=1, rateSPI=0, rateRes=0)
-    writer.write(cfg_nav_dop.serialize())
-    await writer.drain()
-    await asyncio.sleep(0.1)
 
-    # Enable RXM-MEASX (0x02, 0x14)
-    cfg_rxm_measx = UBXMessage('CFG', 'CFG-MSG', 0, msgClass=0x02, msgID=0x14, rateDDC=0, rateUART1=0, rateUART2=0, rateUSB=1, rateSPI=0, rateRes=0)
-    writer.write(cfg_rxm_measx.serialize())
-    await writer.drain()
-    await asyncio.sleep(0.1)
+def optField(v: Optional[float]) -> str:
+    return f"{v:.3f}" if v is not None else ""
 
-    print("Sent UBX-CFG-MSG commands to enable NAV-SAT, NAV-DOP, RXM-MEASX", file=sys.stderr)
 
+def initializeReceiver(stream: serial.Serial) -> None:
+    """Send one UBX-CFG-VALSET enabling NAV-SAT, NAV-SIG, NAV-DOP, and RXM-MEASX on USB."""
+    # All four rates go in a single RAM-layer transaction, so there is nothing to pace between writes.
+    # The ACK-ACK that comes back is ignored by the collect loop's identity routing.
+    cfgMsgOut = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, [
+        ("CFG_MSGOUT_UBX_NAV_SAT_USB", 1),
+        ("CFG_MSGOUT_UBX_NAV_SIG_USB", 1),  # provides freqId for dual-band analysis
+        ("CFG_MSGOUT_UBX_NAV_DOP_USB", 1),
+        ("CFG_MSGOUT_UBX_RXM_MEASX_USB", 1),
+    ])
+    stream.write(cfgMsgOut.serialize())
 
-async def collectTask(port: str, baud: int, label: str, outPath: Path) -> None:
-    reader, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baud)
-    loop = asyncio.get_running_loop()
-
-    # Initialize receiver to enable required UBX messages
-    await initializeReceiver(writer)
-
-    # Create a wrapper class that makes async reader work with UBXReader (binary UBX only)
-    class AsyncStreamWrapper:
-        def __init__(self, async_reader: asyncio.StreamReader):
-            self._reader = async_reader
-            self._buffer = bytearray()
-            self._loop = loop
-
-        def read(self, n: int = 1) -> bytes:
-            # Synchronous read that blocks until data is available
-            # This is called by UBXReader.read() internally for binary UBX messages
-            while len(self._buffer) < n:
-                # Schedule async read on the main loop from this worker thread
-                fut = asyncio.run_coroutine_threadsafe(self._reader.read(4096), self._loop)
-                chunk = fut.result()
-                if not chunk:
-                    break
-                self._buffer.extend(chunk)
-
-            result = bytes(self._buffer[:n])
-            self._buffer = self._buffer[n:]
-            return result
-
-        def readline(self) -> bytes:
-            # NMEA messages may arrive on the serial stream but we ignore them
-            # This method discards NMEA sentences (newline-delimited text) and returns empty
-            while True:
-                newline_idx = self._buffer.find(b"\n")
-                if newline_idx != -1:
-                    # Discard the NMEA message including the newline
-                    self._buffer = self._buffer[newline_idx + 1:]
-                    # Return empty bytes to signal UBXReader to skip this message
-                    return b""
-
-                fut = asyncio.run_coroutine_threadsafe(self._reader.read(4096), self._loop)
-                chunk = fut.result()
-                if not chunk:
-                    # End of stream - return any buffered remainder as empty
-                    self._buffer.clear()
-                    return b""
-                self._buffer.extend(chunk)
-
-    stream = AsyncStreamWrapper(reader)
-    ubxReader = UBXReader(stream, protfilter=2)  # UBX only
-    acc = UbxEpochAccumulator(label=label)
-    wroteHeader = False
+    print("Sent UBX-CFG-VALSET to enable NAV-SAT, NAV-SIG, NAV-DOP, RXM-MEASX", file=sys.stderr)
 
+
+class SerialReadAhead:
+    """Serve UBXReader's many small reads from large reads of the port.
+
+    UBXReader asks for a byte or a few at a time. Each refill here takes
+    everything the port already has waiting, up to chunkSize, in one call.
+    """
+
+    def __init__(self, stream: serial.Serial, chunkSize: int = 65536, compactAt: int = 4096) -> None:
+        self.stream = stream
+        self.chunkSize = chunkSize
+        self.compactAt = compactAt
+        self.buffer = bytearray()
+        self.head = 0  # consumed bytes before head are dropped in bulk, not per read
+
+    def refill(self) -> bool:
+        if self.head > self.compactAt:
+            del self.buffer[:self.head]
+            self.head = 0
+        # Blocks for at least one byte, up to the port timeout
+        chunk = self.stream.read(max(1, min(self.stream.in_waiting, self.chunkSize)))
+        self.buffer.extend(chunk)
+        return len(chunk) > 0
+
+    def read(self, n: int = 1) -> bytes:
+        while len(self.buffer) - self.head < n and self.refill():
+            pass
+        with memoryview(self.buffer) as view:
+            result = bytes(view[self.head:self.head + n])
+        self.head += len(result)
+        return result
+
+    def readline(self) -> bytes:
+        # Only called for NMEA, which we filter out anyway, so skip straight to the next
+        # UBX sync rather than scanning out the line. The empty return reads as EOF to
+        # UBXReader, which the collect loop treats like any other non-UBX result.
+        while (idx := self.buffer.find(UBX_SYNC, self.head)) == -1:
+            # Keep a trailing 0xB5 in case its 0x62 is in the next chunk
+            self.head = max(self.head, len(self.buffer) - 1)
+            if not self.refill():
+                return b""
+        self.head = idx
+        return b""
+
+
+def collectBlocking(stream: serial.Serial, label: str, outPath: Path, stop: threading.Event) -> None:
+    # Whole read loop runs on one worker thread against the blocking port, which
+    # it closes when done. The port timeout bounds how long it takes to notice stop.
     try:
-        with outPath.open("w", newline="") as f:
-            w = csv.writer(f)
-            while True:
+        initializeReceiver(stream)
+
+        # Compile (or load from cache) the numba kernel now rather than on the first epoch
+        aggSats(np.zeros(1), np.zeros(1), np.zeros(1))
+
+        ubxReader = UBXReader(SerialReadAhead(stream), protfilter=2)  # UBX only
+        acc = UbxEpochAccumulator(label=label)
+        wroteHeader = False
+        labelField = csvField(label)
+
+        with outPath.open("w", newline="", buffering=1 << 16) as f:
+            while not stop.is_set():
                 try:
-                    raw_msg, parsed_msg = await asyncio.to_thread(ubxReader.read)
+                    raw_msg, parsed_msg = ubxReader.read()
                     if not isinstance(parsed_msg, UBXMessage):
                         continue
                     msg = parsed_msg
                     clsId = f"{msg.identity}"
-                    # Epoch boundary detection: prefer iTOW from messages that carry it
-                    incomingItow: Optional[int] = None
-                    if hasattr(msg, "gpsTOW"):
-                        incomingItow = int(getattr(msg, "gpsTOW"))
-                        feat = acc.flushIfEpochChanged(incomingItow)
+                    # Epoch boundary detection: NAV messages carry iTOW, RXM-MEASX carries gpsTOW
+                    incomingItow: Optional[int] = getattr(msg, "iTOW", None)
+                    if incomingItow is None:
+                        incomingItow = getattr(msg, "gpsTOW", None)
+                    if incomingItow is not None:
+                        feat = acc.flushIfEpochChanged(int(incomingItow))
                         if feat is not None:
                             if not wroteHeader:
-                                w.writerow([
-                                    "label","utcTowMs","numTracked","meanCn0","fracAbove70",
-                                    "elevWeightedCoverage","meanAbsPrRes","highElevCn0Std",
-                                    "dualBandFrac","pdop","tdop","noSlipFrac"
-                                ])
+                                f.write(",".join(FEATURE_COLUMNS) + "\r\n")
                                 wroteHeader = True
-                            w.writerow([
-                                feat.label, feat.utcTowMs, feat.numTracked, f"{feat.meanCn0:.3f}",
-                                f"{feat.fracAbove70:.6f}", f"{feat.elevWeightedCoverage:.6f}",
-                                f"{feat.meanAbsPrRes:.3f}", f"{feat.highElevCn0Std:.3f}",
-                                f"{feat.dualBandFrac:.6f}",
-                                f"{feat.pdop:.3f}" if feat.pdop is not None else "",
-                                f"{feat.tdop:.3f}" if feat.tdop is not None else "",
-                                f"{feat.noSlipFrac:.6f}",
-                            ])
+                            f.write(FEATURE_ROW_FMT.format(
+                                labelField, feat.utcTowMs, feat.numTracked, feat.meanCn0,
+                                feat.fracAbove70, feat.elevWeightedCoverage,
+                                feat.meanAbsPrRes, feat.highElevCn0Std,
+                                feat.dualBandFrac, optField(feat.pdop), optField(feat.tdop),
+                                feat.noSlipFrac,
+                            ))
                     # Route messages
                     if clsId == "NAV-SAT":
                         acc.onNavSat(msg)
@@ -378,21 +446,25 @@ async def collectTask(port: str, baud: int, label: str, outPath: Path) -> None:
                         acc.onNavDop(msg)
                     elif clsId == "RXM-MEASX":
                         acc.onRxmMeasx(msg)
-                except asyncio.CancelledError:
-                    break
                 except Exception as e:
                     print(f"collector error: {e}", file=sys.stderr)
                     traceback.print_exc(file=sys.stderr)
-                    await asyncio.sleep(0.1)
+                    time.sleep(0.1)
     finally:
-        writer.close()
-        try:
-            await writer.wait_closed()
-        except Exception:
-            pass
+        stream.close()
 
 
-@dataclass
+async def collectTask(port: str, baud: int, label: str, outPath: Path) -> None:
+    stream = serial.Serial(port, baud, timeout=1)
+    stop = threading.Event()
+    try:
+        await asyncio.to_thread(collectBlocking, stream, label, outPath, stop)
+    finally:
+        # On cancellation the worker thread is still reading, ask it to wind down
+        stop.set()
+
+
+@dataclass(slots=True)
 class ScoreWeights:
     satelliteAvailability: float = 1.0
     signalQuality: float = 1.0
@@ -403,7 +475,7 @@ class ScoreWeights:
     lockContinuity: float = 1.0
 
 
-@dataclass
+@dataclass(slots=True)
 class Scores:
     label: str
     satelliteAvailability: float
@@ -430,58 +502,47 @@ def mapLinearToScore(v: float, vLo: float, vHi: float, invert: bool = False) ->
     return 1.0 + 9.0 * t
 
 
-def scoreFromAggregates(rows: List[Dict[str, str]], label: str, weights: ScoreWeights) -> Scores:
+# Per-epoch CSV columns that are averaged per label
+SCORE_COLUMNS = FEATURE_COLUMNS[2:]
+
+
+def readFeatureCsvs(paths: List[Path]) -> Any:
+    # Parsed in C straight to columns; only blank fields are NaN so a label like "NA" survives
+    return pd.concat([
+        pd.read_csv(
+            p,
+            dtype={"label": str, **{c: np.float64 for c in SCORE_COLUMNS}},
+            keep_default_na=False,
+            na_values={c: [""] for c in SCORE_COLUMNS},
+        )
+        for p in paths
+    ], ignore_index=True)
+
+
+def columnsByLabel(df: Any) -> Dict[str, Dict[str, NDArray[np.float64]]]:
+    # One groupby, then one float array per column with NaN for blanks
+    return {
+        str(label): {c: group[c].to_numpy(dtype=np.float64) for c in SCORE_COLUMNS}
+        for label, group in df.groupby("label", sort=False)
+    }
+
+
+def scoreFromAggregates(cols: Dict[str, NDArray[np.float64]], label: str, weights: ScoreWeights) -> Scores:
     # Aggregate per label
-    numTracked: List[float] = []
-    meanCn0: List[float] = []
-    fracAbove70: List[float] = []
-    elevWeightedCoverage: List[float] = []
-    meanAbsPrRes: List[float] = []
-    highElevCn0Std: List[float] = []
-    dualBandFrac: List[float] = []
-    pdop: List[float] = []
-    tdop: List[float] = []
-    noSlipFrac: List[float] = []
-
-    for r in rows:
-        if r["label"] != label:
-            continue
-        def f(x: str) -> Optional[float]:
-            return float(x) if x != "" else None
-        n = f(r["numTracked"])
-        m = f(r["meanCn0"])
-        f70 = f(r["fracAbove70"])
-        ewc = f(r["elevWeightedCoverage"])
-        pr = f(r["meanAbsPrRes"])
-        hs = f(r["highElevCn0Std"])
-        db = f(r["dualBandFrac"])
-        p = f(r["pdop"])
-        t = f(r["tdop"])
-        ns = f(r["noSlipFrac"])
-        if n is not None: numTracked.append(n)  # noqa: E701
-        if m is not None: meanCn0.append(m)  # noqa: E701
-        if f70 is not None: fracAbove70.append(f70)  # noqa: E701
-        if ewc is not None: elevWeightedCoverage.append(ewc)  # noqa: E701
-        if pr is not None: meanAbsPrRes.append(pr)  # noqa: E701
-        if hs is not None: highElevCn0Std.append(hs)  # noqa: E701
-        if db is not None: dualBandFrac.append(db)  # noqa: E701
-        if p is not None: pdop.append(p)  # noqa: E701
-        if t is not None: tdop.append(t)  # noqa: E701
-        if ns is not None: noSlipFrac.append(ns)  # noqa: E701
-
-    def avg(x: List[float], default: float) -> float:
-        return sum(x) / len(x) if len(x) > 0 else default
-
-    aNumTracked = avg(numTracked, 0.0)
-    aMeanCn0 = avg(meanCn0, 0.0)
-    aFracAbove70 = avg(fracAbove70, 0.0)
-    aElevWeightedCoverage = avg(elevWeightedCoverage, 0.0)
-    aMeanAbsPrRes = avg(meanAbsPrRes, 10.0)  # meters, rough
-    aHighElevCn0Std = avg(highElevCn0Std, 4.0)
-    aDualBandFrac = avg(dualBandFrac, 0.0)
-    aPdop = avg(pdop, 3.0)
-    aTdop = avg(tdop, 2.0)
-    aNoSlipFrac = avg(noSlipFrac, 1.0)
+    def avg(x: NDArray[np.float64], default: float) -> float:
+        x = x[~np.isnan(x)]
+        return float(x.mean()) if x.size > 0 else default
+
+    aNumTracked = avg(cols["numTracked"], 0.0)
+    aMeanCn0 = avg(cols["meanCn0"], 0.0)
+    aFracAbove70 = avg(cols["fracAbove70"], 0.0)
+    aElevWeightedCoverage = avg(cols["elevWeightedCoverage"], 0.0)
+    aMeanAbsPrRes = avg(cols["meanAbsPrRes"], 10.0)  # meters, rough
+    aHighElevCn0Std = avg(cols["highElevCn0Std"], 4.0)
+    aDualBandFrac = avg(cols["dualBandFrac"], 0.0)
+    aPdop = avg(cols["pdop"], 3.0)
+    aTdop = avg(cols["tdop"], 2.0)
+    aNoSlipFrac = avg(cols["noSlipFrac"], 1.0)
 
     # Scores (tweak thresholds as you collect)
     sAvail = mapLinearToScore(aNumTracked, 4.0, 30.0, invert=False)
@@ -541,14 +602,8 @@ def scoreFromAggregates(rows: List[Dict[str, str]], label: str, weights: ScoreWe
 
 
 def analyzeFiles(paths: List[Path]) -> None:
-    rows: List[Dict[str, str]] = []
-    for p in paths:
-        with p.open() as f:
-            reader = csv.DictReader(f)
-            for r in reader:
-                rows.append(r)
-
-    labels = sorted({r["label"] for r in rows})
+    byLabel = columnsByLabel(readFeatureCsvs(paths)) if paths else {}
+    labels = sorted(byLabel)
     weights = ScoreWeights()
 
     outRows: List[Dict[str, str]] = []
@@ -561,7 +616,7 @@ def analyzeFiles(paths: List[Path]) -> None:
     ]
     print("{:18} {:>7} {:>6} {:>9} {:>8} {:>7} {:>8} {:>5} {:>8}".format(*header))
     for lab in labels:
-        sc = scoreFromAggregates(rows, lab, weights)
+        sc = scoreFromAggregates(byLabel[lab], lab, weights)
         print("{:18} {:7.2f} {:6.2f} {:9.2f} {:8.2f} {:7.2f} {:8.2f} {:5.2f} {:8.2f}".format(
             sc.label, sc.satelliteAvailability, sc.signalQuality, sc.multipathResistance,
             sc.dualBandCoverage, sc.skyView, sc.geometryQuality, sc.lockContinuity, sc.summaryScore
@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 import serial
 from serial import SerialException
-from pyubx2 import UBXMessage, UBXReader, POLL, POLL_LAYER_RAM, SIGCFMASK
-from enum import Enum, auto
+from pyubx2 import UBXMessage, POLL, POLL_LAYER_RAM, SIGCFMASK
 import sys
-import os
+from ioUtil import ACK_TIMEOUT, envPortBaud, readUbxMessages
 
 gnssNameById = {
     0: "GPS",
@@ -48,110 +47,82 @@ dynModelByValue = {
     12: 'ESCOOTER' # E-scooter (not available in all products)
 }
 
-class State(Enum): # Try to keep in order of execution, just for sanity
-    PollTp   = auto()
-    WaitTp   = auto()
-    PollGrid = auto()
-    WaitGrid = auto()
-    PollFpos = auto()
-    WaitFpos = auto()
-    PollDMdl = auto()
-    WaitDMdl = auto()
-    PollGnss = auto()
-    WaitGnss = auto()
-
-
-state = State.PollTp
-
 # Config Keys
 KEY_TPMSGFREQ = 'CFG_MSGOUT_UBX_TIM_TP_USB'
 KEY_TIMEGRID  = 'CFG_TP_TIMEGRID_TP1'
 KEY_FPMODE    = 'CFG_TMODE_MODE'
 KEY_DYNMODEL  = 'CFG_NAVSPG_DYNMODEL'
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
-
-# N.B. May have to stop gpsd to avoid port conflict
-try:
-    stream = serial.Serial(port, baud)
-except SerialException as e:
-    print(f"Failed to open serial port: {e}")
-    sys.exit(1)
+# How to print each polled key's value from a CFG-VALGET response
+valgetFormatByKey = {
+    KEY_TPMSGFREQ: lambda v: f"TPMSGFREQ: {v} per nav solution",
+    KEY_TIMEGRID:  lambda v: f"TIMEGRID:  {timeReferenceByValue[v]}",
+    KEY_FPMODE:    lambda v: f"TMODE:     {tmodeByValue.get(v, 'Unknown mode')}",
+    KEY_DYNMODEL:  lambda v: f"DYNMODEL:  {dynModelByValue.get(v, 'Unknown model')}",
+}
 
-ubr = UBXReader(stream, protfilter=2)
-while True:
-    # Handle polling states by sending config poll
-    match state:
-        case State.PollTp:
-            pollTpFreq = UBXMessage.config_poll(POLL_LAYER_RAM, 0, [KEY_TPMSGFREQ])
-            stream.write(pollTpFreq.serialize())
-            state = State.WaitTp
-        case State.PollGrid:
-            pollTimegridMsg = UBXMessage.config_poll(POLL_LAYER_RAM, 0, [KEY_TIMEGRID])
-            stream.write(pollTimegridMsg.serialize())
-            state = State.WaitGrid
-        case State.PollFpos:
-            pollFpModeMsg = UBXMessage.config_poll(POLL_LAYER_RAM, 0, [KEY_FPMODE])
-            stream.write(pollFpModeMsg.serialize())
-            state = State.WaitFpos
-        case State.PollDMdl:
-            pollFpModeMsg = UBXMessage.config_poll(POLL_LAYER_RAM, 0, [KEY_DYNMODEL])
-            stream.write(pollFpModeMsg.serialize())
-            state = State.WaitDMdl
-        case State.PollGnss:
-            pollGnssMsg = UBXMessage("CFG", "CFG-GNSS", POLL)
-            stream.write(pollGnssMsg.serialize())
-            state = State.WaitGnss
+# SIGCFMASK is keyed by (gnssId, mask); group it by gnssId so each block only visits its own signals
+sigCfMasksByGnss = {}
+for (gId, mask), signal in SIGCFMASK.items():
+    sigCfMasksByGnss.setdefault(gId, []).append((mask, signal))
 
-    # Blocking read for response
-    (raw_data, parsed_data) = ubr.read()
+# CFG-GNSS repeating block attribute names, built once per block count
+gnssBlockNamesByCount = {}
 
-    # Handle wait states successfully ACK'd by progressing to next polling state
-    if parsed_data and parsed_data.identity == 'ACK-ACK':
-        match state:
-            case State.WaitTp:
-                state = State.PollGrid
-            case State.WaitGrid:
-                state = State.PollFpos
-            case State.WaitFpos:
-                state = State.PollDMdl
-            case State.WaitDMdl:
-                state = State.PollGnss
-            case State.WaitGnss:
-                break # Terminal state
+def gnssBlockNames(numConfigBlocks):
+    names = gnssBlockNamesByCount.get(numConfigBlocks)
+    if names is None:
+        names = tuple((f'enable_{i:02}', f'gnssId_{i:02}', f'sigCfMask_{i:02}')
+                      for i in range(1, numConfigBlocks+1))
+        gnssBlockNamesByCount[numConfigBlocks] = names
+    return names
 
+def printResponse(parsed_data):
     # Decode and print results of expected poll responses
     # print(parsed_data)
-    if parsed_data and parsed_data.identity == 'CFG-VALGET' and dir(parsed_data)[0] == KEY_TPMSGFREQ:
-        freq =  vars(parsed_data)[KEY_TPMSGFREQ]
-        print(f"TPMSGFREQ: {freq} per nav solution")
-    if parsed_data and parsed_data.identity == 'CFG-VALGET' and dir(parsed_data)[0] == KEY_TIMEGRID:
-        grid =  vars(parsed_data)[KEY_TIMEGRID]
-        print(f"TIMEGRID:  {timeReferenceByValue[grid]}")
-    if parsed_data and parsed_data.identity == 'CFG-VALGET' and dir(parsed_data)[0] == KEY_FPMODE:
-        tmode =  vars(parsed_data)[KEY_FPMODE]
-        print(f"TMODE:     {tmodeByValue.get(tmode, 'Unknown mode')}")
-    if parsed_data and parsed_data.identity == 'CFG-VALGET' and dir(parsed_data)[0] == KEY_DYNMODEL:
-        dynmodel =  vars(parsed_data)[KEY_DYNMODEL]
-        print(f"DYNMODEL:  {dynModelByValue.get(dynmodel, 'Unknown model')}")
-    if parsed_data and parsed_data.identity == 'CFG-GNSS':
-        for i in range(1, parsed_data.numConfigBlocks+1):
-            enableNN    = f'enable_{i:02}'
-            gnssIdNN    = f'gnssId_{i:02}'
-            sigCfMaskNN = f'sigCfMask_{i:02}'
+    identity = parsed_data.identity
+    if identity == 'CFG-VALGET':
+        for key, fmt in valgetFormatByKey.items():
+            if hasattr(parsed_data, key):
+                print(fmt(getattr(parsed_data, key)))
+    elif identity == 'CFG-GNSS':
+        for enableNN, gnssIdNN, sigCfMaskNN in gnssBlockNames(parsed_data.numConfigBlocks):
             enable    = getattr(parsed_data, enableNN)
             gnssId    = getattr(parsed_data, gnssIdNN)
             sigCfMask = getattr(parsed_data, sigCfMaskNN)
             if enable:
-                for (gId, mask), signal in SIGCFMASK.items():
-                    if gId == gnssId:
-                        if sigCfMask & mask:
-                            print(f"Enabled:   {signal}")
+                for mask, signal in sigCfMasksByGnss.get(gnssId, ()):
+                    if sigCfMask & mask:
+                        print(f"Enabled:   {signal}")
             else:
-                print(f"Disabled:  {gnssNameById[gnssId]}")
+                print(f"Disabled:  {gnssNameById.get(gnssId, f'Unknown({gnssId})')}")
+
+def pollAndWait(stream, pollName, pollBytes):
+    # Send one poll, print its responses, and return once the receiver ACKs it
+    stream.write(pollBytes)
+    for parsed_data in readUbxMessages(stream, ACK_TIMEOUT):
+        if parsed_data.identity == 'ACK-ACK':
+            return
+        if parsed_data.identity == 'ACK-NAK':
+            raise RuntimeError(f"Got a NAK polling {pollName}")
+        printResponse(parsed_data)
 
-    # Handle NAK
-    if parsed_data and parsed_data.identity == 'ACK-NAK':
-        print(f"Got a NAK in state {state.name}")
-        break
+port, baud = envPortBaud()
+
+# N.B. May have to stop gpsd to avoid port conflict
+try:
+    stream = serial.Serial(port, baud)
+except SerialException as e:
+    print(f"Failed to open serial port: {e}")
+    sys.exit(1)
+
+# Polls serialized once. All the config keys go in one VALGET.
+pollValget = UBXMessage.config_poll(POLL_LAYER_RAM, 0, list(valgetFormatByKey)).serialize()
+pollGnss   = UBXMessage("CFG", "CFG-GNSS", POLL).serialize()
+
+try:
+    pollAndWait(stream, 'CFG-VALGET', pollValget)
+    pollAndWait(stream, 'CFG-GNSS', pollGnss)
+except (RuntimeError, TimeoutError) as e:
+    print(e)
+    sys.exit(1)
@@ -6,49 +6,121 @@ Requirements:
     pip install pyubx2 pyserial numpy matplotlib pandas
 """
 
+import io
 import serial
 import time
 import numpy as np
 import os
 from datetime import datetime, timedelta
-from collections import defaultdict
 import json
-from pyubx2 import UBXReader, UBXMessage
+from pyubx2 import UBXReader, UBXMessage, SET_LAYER_RAM, TXN_NONE
+import matplotlib
+matplotlib.use('Agg')  # Plots are only ever saved to PNG
 import matplotlib.pyplot as plt
 import pandas as pd
 
 
+# One NAV-SAT satellite block; each message is stored as an array of these
+SAT_DTYPE = np.dtype([
+    ('ts', 'i8'),          # Host monotonic ns since start_ns
+    ('gnssId', 'u1'),
+    ('svId', 'u1'),
+    ('cno', 'u1'),         # C/N0 in dB-Hz
+    ('elev', 'i1'),        # Elevation in degrees
+    ('azim', 'u2'),        # Azimuth in degrees, 0-360
+    ('prRes', 'i2'),       # Pseudorange residual, raw units of PR_RES_SCALE m
+    ('qualityInd', 'u1'),  # 0-7: no signal -> code+carrier locked
+    ('svUsed', '?'),       # Used in navigation solution
+    ('health', 'u1'),      # 0=unknown, 1=healthy, 2=unhealthy
+])
+
+PR_RES_SCALE = 0.1  # NAV-SAT prRes is I2 in units of 0.1 m
+
+# NAV-SAT frames kept in memory before appending them to the spool file
+SPOOL_FRAMES = 1000
+
+# NAV-SAT payload: 8-byte header, then numSvs 12-byte blocks laid out as on the wire
+NAV_SAT_HDR_LEN = 8
+NAV_SAT_REC_DTYPE = np.dtype([
+    ('gnssId', 'u1'), ('svId', 'u1'), ('cno', 'u1'), ('elev', 'i1'),
+    ('azim', '<i2'), ('prRes', '<i2'), ('flags', '<u4'),
+])
+
+
+def _column(records, key):
+    """One field of a list of per-message dicts as a float64 array"""
+    return np.fromiter((r[key] for r in records), dtype=np.float64, count=len(records))
+
+
+def _elapsed_s(records):
+    """Seconds since the first of a list of per-message dicts"""
+    ts = np.fromiter((r['timestamp'] for r in records), dtype=np.int64, count=len(records))
+    return (ts - ts[0]) * 1e-9
+
+
+class SerialChunkReader(io.RawIOBase):
+    """Raw stream over a serial port that returns whatever is already waiting
+
+    Wrapped in io.BufferedReader this turns UBXReader's many small reads into
+    one port read per chunk, without blocking for a full buffer the way a
+    BufferedReader directly over the port would.
+    """
+
+    def __init__(self, ser):
+        self.ser = ser
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # Blocks for at least one byte, up to the port timeout
+        data = self.ser.read(min(len(b), max(1, self.ser.in_waiting)))
+        b[:len(data)] = data
+        return len(data)
+
+
 class F9TTimingAnalyzer:
-    def __init__(self, port, baudrate=38400):
+    def __init__(self, port, baudrate=38400, spool_path=None):
         """
         Initialize analyzer for u-blox F9T timing evaluation
         
         Args:
             port: Serial port (e.g., 'COM3' or '/dev/ttyUSB0')
             baudrate: Communication speed (default 38400)
+            spool_path: If set, NAV-SAT records are written to this file in
+                batches instead of being kept in memory for the whole run
         """
         self.port = port
         self.baudrate = baudrate
         self.ser = None
         
         # Data storage
-        self.nav_sat_data = []  # Satellite signal quality
+        self.nav_sat_data = []  # Satellite signal quality, frames not yet spooled
+        self.nav_sat_count = 0
+        self.spool_path = spool_path
+        self.spool = open(spool_path, 'wb') if spool_path else None
+
+        # Running C/N0 stats over used satellites: count, mean, sum of squared deviations, min
+        self.cno_count = 0
+        self.cno_mean = 0.0
+        self.cno_m2 = 0.0
+        self.cno_min = np.inf
         self.nav_pvt_data = []  # Position/velocity/time
         self.nav_clock_data = []  # Clock bias and drift
         self.tim_tp_data = []  # Time pulse data
         self.nav_dop_data = []  # Dilution of precision
         
-        # Statistics accumulators
-        self.satellite_cn0 = defaultdict(list)
-        self.satellite_multipath = defaultdict(list)
-        self.satellite_prres = defaultdict(list)
+        # Message timestamps are host monotonic ns since start_ns; start_wall
+        # is the wall clock at the same instant, for converting back
+        self.start_ns = time.monotonic_ns()
+        self.start_wall = np.datetime64(datetime.now(), 'ns')
         
     def connect(self):
         """Establish serial connection"""
         try:
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=1)
+            # Short timeout keeps idle reads from stalling the collect loop
+            self.ser = serial.Serial(self.port, self.baudrate, timeout=0.05)
             print(f"Connected to {self.port} at {self.baudrate} baud")
-            time.sleep(2)  # Allow device to stabilize
             return True
         except Exception as e:
             print(f"Connection error: {e}")
@@ -60,23 +132,15 @@ class F9TTimingAnalyzer:
             print("Not connected!")
             return False
         
-        # Messages to enable for timing analysis
-        # Format: (msg_class, msg_id, rate)
-        messages = [
-            (0x01, 0x35, 1),  # UBX-NAV-SAT (satellite info)
-            (0x01, 0x07, 1),  # UBX-NAV-PVT (position/velocity/time)
-            (0x01, 0x22, 1),  # UBX-NAV-CLOCK (clock solution)
-            (0x0D, 0x01, 1),  # UBX-TIM-TP (time pulse timedata)
-            (0x01, 0x04, 5),  # UBX-NAV-DOP (dilution of precision)
-        ]
-        
-        for msg_class, msg_id, rate in messages:
-            # CFG-MSG to set message rate
-            # Rate array: [DDC/I2C, UART1, UART2, USB, SPI, reserved]
-            msg = UBXMessage('CFG', 'CFG-MSG', 0, msgClass=msg_class, msgID=msg_id,
-                           rateDDC=0, rateUART1=0, rateUART2=0, rateUSB=rate, rateSPI=0, rateRes=0)
-            self.ser.write(msg.serialize())
-            time.sleep(0.1)
+        # Message output rates on USB for timing analysis, set in one RAM-layer transaction
+        msg = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, [
+            ('CFG_MSGOUT_UBX_NAV_SAT_USB', 1),    # satellite info
+            ('CFG_MSGOUT_UBX_NAV_PVT_USB', 1),    # position/velocity/time
+            ('CFG_MSGOUT_UBX_NAV_CLOCK_USB', 1),  # clock solution
+            ('CFG_MSGOUT_UBX_TIM_TP_USB', 1),     # time pulse timedata
+            ('CFG_MSGOUT_UBX_NAV_DOP_USB', 5),    # dilution of precision
+        ])
+        self.ser.write(msg.serialize())
         
         print("F9T configured for timing analysis")
         return True
@@ -92,7 +156,8 @@ class F9TTimingAnalyzer:
             print("Not connected!")
             return
         
-        ubr = UBXReader(self.ser, protfilter=2)  # 2 = UBX only
+        stream = io.BufferedReader(SerialChunkReader(self.ser), buffer_size=4096)
+        ubr = UBXReader(stream, protfilter=2)  # 2 = UBX only
         start_time = time.time()
         end_time = start_time + (duration_minutes * 60)
         
@@ -126,13 +191,13 @@ class F9TTimingAnalyzer:
             print("\nData collection stopped by user")
         
         print(f"\nCollection complete. Processed {message_count} messages")
-        print(f"NAV-SAT: {len(self.nav_sat_data)}, "
+        print(f"NAV-SAT: {self.nav_sat_count}, "
               f"NAV-PVT: {len(self.nav_pvt_data)}, "
               f"NAV-CLOCK: {len(self.nav_clock_data)}")
     
     def _process_message(self, msg):
         """Process received UBX message"""
-        timestamp = datetime.now()
+        timestamp = time.monotonic_ns() - self.start_ns
         
 #        print(f"Received {msg.identity} at {timestamp}")
         if msg.identity == 'NAV-SAT':
@@ -150,32 +215,55 @@ class F9TTimingAnalyzer:
     
     def _process_nav_sat(self, msg, timestamp):
         """Process NAV-SAT message for signal quality"""
-        for i in range(msg.numSvs):
-            idx = f'{i+1:02d}'
-            sat_data = {
-                'timestamp': timestamp,
-                'gnssId': getattr(msg, f'gnssId_{idx}'),
-                'svId': getattr(msg, f'svId_{idx}'),
-                'cno': getattr(msg, f'cno_{idx}'),  # C/N0 in dB-Hz
-                'elev': getattr(msg, f'elev_{idx}'),  # Elevation in degrees
-                'azim': getattr(msg, f'azim_{idx}'),  # Azimuth in degrees
-                'prRes': getattr(msg, f'prRes_{idx}') * 0.1,  # Pseudorange residual in meters
-            }
-
-            # In modern pyubx2, flags are broken out into individual attributes
-            # Quality indicator (0-7): no signal -> code+carrier locked
-            sat_data['qualityInd'] = getattr(msg, f'qualityInd_{idx}', 0)
-            # svUsed: whether satellite is used in navigation solution
-            sat_data['svUsed'] = bool(getattr(msg, f'svUsed_{idx}', False))
-            # health: satellite health (0=unknown, 1=healthy, 2=unhealthy)
-            sat_data['health'] = getattr(msg, f'health_{idx}', 0)
-
-            self.nav_sat_data.append(sat_data)
-
-            # Accumulate per-satellite statistics
-            sat_key = (sat_data['gnssId'], sat_data['svId'])
-            self.satellite_cn0[sat_key].append(sat_data['cno'])
-            self.satellite_prres[sat_key].append(sat_data['prRes'])
+        # Unpacked straight from the payload rather than through pyubx2's per-block attributes
+        recs = np.frombuffer(msg.payload, dtype=NAV_SAT_REC_DTYPE, count=msg.numSvs, offset=NAV_SAT_HDR_LEN)
+        flags = recs['flags']
+        sats = np.empty(recs.size, dtype=SAT_DTYPE)
+        sats['ts'] = timestamp
+        for field in ('gnssId', 'svId', 'cno', 'elev', 'azim', 'prRes'):
+            sats[field] = recs[field]
+        sats['qualityInd'] = flags & 0x07
+        sats['svUsed'] = (flags & 0x08) != 0
+        sats['health'] = (flags >> 4) & 0x03
+
+        self._update_cno_stats(sats['cno'][sats['svUsed']])
+        self.nav_sat_data.append(sats)
+        self.nav_sat_count += 1
+        if self.spool and len(self.nav_sat_data) >= SPOOL_FRAMES:
+            self._flush_spool()
+
+    def _update_cno_stats(self, cno):
+        """Fold one frame's C/N0 samples into the running stats (Welford, merged per batch)"""
+        n = cno.size
+        if n == 0:
+            return
+        x = cno.astype(np.float64)
+        batch_mean = x.mean()
+        total = self.cno_count + n
+        delta = batch_mean - self.cno_mean
+        self.cno_mean += delta * n / total
+        self.cno_m2 += ((x - batch_mean)**2).sum() + delta * delta * self.cno_count * n / total
+        self.cno_count = total
+        self.cno_min = min(self.cno_min, x.min())
+
+    def _flush_spool(self):
+        """Append pending NAV-SAT frames to the spool file as raw SAT_DTYPE records"""
+        if self.nav_sat_data:
+            np.concatenate(self.nav_sat_data).tofile(self.spool)
+            self.nav_sat_data.clear()
+        self.spool.flush()
+
+    def _sat_records(self):
+        """All NAV-SAT records so far, memory-mapped from the spool file if there is one"""
+        if self.spool_path:
+            if not self.spool.closed:
+                self._flush_spool()
+            if os.path.getsize(self.spool_path) > 0:
+                return np.memmap(self.spool_path, dtype=SAT_DTYPE, mode='r')
+            return np.empty(0, dtype=SAT_DTYPE)
+        if not self.nav_sat_data:
+            return np.empty(0, dtype=SAT_DTYPE)
+        return np.concatenate(self.nav_sat_data)
     
     def _process_nav_pvt(self, msg, timestamp):
         """Process NAV-PVT message"""
@@ -252,58 +340,59 @@ class F9TTimingAnalyzer:
     
     def analyze_metrics(self):
         """Analyze collected data and generate metrics"""
-        if not self.nav_sat_data:
+        if not self.nav_sat_count:
             print("No data to analyze!")
             return None
         
         metrics = {}
         
-        # Signal quality metrics
-        all_cn0 = [s['cno'] for s in self.nav_sat_data if s['svUsed']]
-        metrics['cn0_mean'] = float(np.mean(all_cn0)) if all_cn0 else 0
-        metrics['cn0_std'] = float(np.std(all_cn0)) if all_cn0 else 0
-        metrics['cn0_min'] = float(np.min(all_cn0)) if all_cn0 else 0
+        sats = self._sat_records()
+        used = sats[sats['svUsed']]
+        have_used = used.size > 0
+
+        # Signal quality metrics, accumulated during collection
+        metrics['cn0_mean'] = float(self.cno_mean) if have_used else 0
+        metrics['cn0_std'] = float(np.sqrt(self.cno_m2 / self.cno_count)) if have_used else 0
+        metrics['cn0_min'] = float(self.cno_min) if have_used else 0
 
         # Multipath assessment (via pseudorange residuals)
-        all_prres = [abs(s['prRes']) for s in self.nav_sat_data if s['svUsed']]
-        metrics['prres_mean'] = float(np.mean(all_prres)) if all_prres else 0
-        metrics['prres_std'] = float(np.std(all_prres)) if all_prres else 0
-        metrics['prres_95pct'] = float(np.percentile(all_prres, 95)) if all_prres else 0
+        all_prres = np.abs(used['prRes'] * PR_RES_SCALE)
+        metrics['prres_mean'] = float(all_prres.mean()) if have_used else 0
+        metrics['prres_std'] = float(all_prres.std()) if have_used else 0
+        metrics['prres_95pct'] = float(np.percentile(all_prres, 95)) if have_used else 0
 
         # Sky coverage
-        elevations = [s['elev'] for s in self.nav_sat_data if s['svUsed']]
-        metrics['avg_elevation'] = float(np.mean(elevations)) if elevations else 0
-        metrics['sats_above_30deg'] = float(sum(1 for e in elevations if e >= 30) / len(elevations)) if elevations else 0
+        elevations = used['elev']
+        metrics['avg_elevation'] = float(elevations.mean()) if have_used else 0
+        metrics['sats_above_30deg'] = float((elevations >= 30).mean()) if have_used else 0
 
         # Timing accuracy from NAV-PVT
         if self.nav_pvt_data:
-            t_accs = [p['tAcc'] for p in self.nav_pvt_data]
-            metrics['time_acc_mean_ns'] = float(np.mean(t_accs) * 1e9)
-            metrics['time_acc_rms_ns'] = float(np.sqrt(np.mean(np.array(t_accs)**2)) * 1e9)
+            t_accs = _column(self.nav_pvt_data, 'tAcc')
+            metrics['time_acc_mean_ns'] = float(t_accs.mean() * 1e9)
+            metrics['time_acc_rms_ns'] = float(np.sqrt(np.einsum('i,i->', t_accs, t_accs) / t_accs.size) * 1e9)
 
         # Clock metrics from NAV-CLOCK
         if self.nav_clock_data:
             # Clock drift (rate of change of clock bias)
-            clk_drifts = [c['clkD'] for c in self.nav_clock_data]
-            metrics['clock_drift_mean_ns_per_s'] = float(np.mean(clk_drifts) * 1e9)
-            metrics['clock_drift_std_ns_per_s'] = float(np.std(clk_drifts) * 1e9)
+            clk_drifts = _column(self.nav_clock_data, 'clkD')
+            metrics['clock_drift_mean_ns_per_s'] = float(clk_drifts.mean() * 1e9)
+            metrics['clock_drift_std_ns_per_s'] = float(clk_drifts.std() * 1e9)
 
             # Time accuracy estimate from receiver
-            t_accs_clk = [c['tAcc'] for c in self.nav_clock_data]
-            metrics['time_acc_clock_mean_ns'] = float(np.mean(t_accs_clk) * 1e9)
+            metrics['time_acc_clock_mean_ns'] = float(_column(self.nav_clock_data, 'tAcc').mean() * 1e9)
 
             # Frequency accuracy estimate (converted from s/s to ppb - parts per billion)
-            f_accs = [c['fAcc'] for c in self.nav_clock_data]
-            metrics['freq_acc_mean_ppb'] = float(np.mean(f_accs) * 1e9)
+            metrics['freq_acc_mean_ppb'] = float(_column(self.nav_clock_data, 'fAcc').mean() * 1e9)
 
         # DOP values
         if self.nav_dop_data:
-            metrics['pdop_mean'] = float(np.mean([d['pDOP'] for d in self.nav_dop_data]))
-            metrics['tdop_mean'] = float(np.mean([d['tDOP'] for d in self.nav_dop_data]))
+            metrics['pdop_mean'] = float(_column(self.nav_dop_data, 'pDOP').mean())
+            metrics['tdop_mean'] = float(_column(self.nav_dop_data, 'tDOP').mean())
 
         # Satellite count
         if self.nav_pvt_data:
-            metrics['avg_num_sv'] = float(np.mean([p['numSV'] for p in self.nav_pvt_data]))
+            metrics['avg_num_sv'] = float(_column(self.nav_pvt_data, 'numSV').mean())
         
         return metrics
     
@@ -356,10 +445,14 @@ class F9TTimingAnalyzer:
         fig = plt.figure(figsize=(15, 10))
         fig.suptitle('GNSS Antenna Performance Analysis', fontsize=16)
 
+        sats = self._sat_records()
+        used = sats[sats['svUsed']]
+        if self.nav_pvt_data:
+            pvt_times = _elapsed_s(self.nav_pvt_data)
+
         # 1. C/N0 distribution
         ax = plt.subplot(2, 3, 1)
-        cn0_values = [s['cno'] for s in self.nav_sat_data if s['svUsed']]
-        ax.hist(cn0_values, bins=30, edgecolor='black')
+        ax.hist(used['cno'], bins=30, edgecolor='black')
         ax.set_xlabel('C/N0 (dB-Hz)')
         ax.set_ylabel('Count')
         ax.set_title('Signal Strength Distribution')
@@ -368,18 +461,18 @@ class F9TTimingAnalyzer:
 
         # 2. Pseudorange residuals
         ax = plt.subplot(2, 3, 2)
-        prres_values = [s['prRes'] for s in self.nav_sat_data if s['svUsed']]
-        ax.hist(prres_values, bins=50, edgecolor='black')
+        ax.hist(used['prRes'] * PR_RES_SCALE, bins=50, edgecolor='black')
         ax.set_xlabel('Pseudorange Residual (m)')
         ax.set_ylabel('Count')
         ax.set_title('Multipath Indicator (PR Residuals)')
 
         # 3. Sky plot (polar projection)
         ax = plt.subplot(2, 3, 3, projection='polar')
-        theta = np.radians([s['azim'] for s in self.nav_sat_data if s['svUsed']])
-        r = [90 - s['elev'] for s in self.nav_sat_data if s['svUsed']]
-        scatter = ax.scatter(theta, r, c=[s['cno'] for s in self.nav_sat_data if s['svUsed']],
-                           cmap='viridis', alpha=0.3, s=20)
+        theta = np.radians(used['azim'])
+        r = 90 - used['elev'].astype(np.int16)
+        # Rasterized so the one point per satellite per epoch is saved as a single image layer
+        scatter = ax.scatter(theta, r, c=used['cno'],
+                           cmap='viridis', alpha=0.3, s=20, rasterized=True)
         ax.set_theta_zero_location('N')
         ax.set_theta_direction(-1)
         ax.set_ylim(0, 90)
@@ -391,10 +484,7 @@ class F9TTimingAnalyzer:
         # 4. Time accuracy over time
         ax = plt.subplot(2, 3, 4)
         if self.nav_pvt_data:
-            times = [(p['timestamp'] - self.nav_pvt_data[0]['timestamp']).total_seconds()
-                    for p in self.nav_pvt_data]
-            t_acc = [p['tAcc'] * 1e9 for p in self.nav_pvt_data]
-            ax.plot(times, t_acc)
+            ax.plot(pvt_times, _column(self.nav_pvt_data, 'tAcc') * 1e9)
             ax.set_xlabel('Time (s)')
             ax.set_ylabel('Time Accuracy (ns)')
             ax.set_title('Time Accuracy Over Session')
@@ -403,10 +493,7 @@ class F9TTimingAnalyzer:
         # 5. Number of satellites
         ax = plt.subplot(2, 3, 5)
         if self.nav_pvt_data:
-            times = [(p['timestamp'] - self.nav_pvt_data[0]['timestamp']).total_seconds()
-                    for p in self.nav_pvt_data]
-            num_sv = [p['numSV'] for p in self.nav_pvt_data]
-            ax.plot(times, num_sv)
+            ax.plot(pvt_times, _column(self.nav_pvt_data, 'numSV'))
             ax.set_xlabel('Time (s)')
             ax.set_ylabel('Number of Satellites')
             ax.set_title('Satellite Visibility')
@@ -415,12 +502,9 @@ class F9TTimingAnalyzer:
         # 6. PDOP and TDOP
         ax = plt.subplot(2, 3, 6)
         if self.nav_dop_data:
-            times = [(d['timestamp'] - self.nav_dop_data[0]['timestamp']).total_seconds()
-                    for d in self.nav_dop_data]
-            pdop = [d['pDOP'] for d in self.nav_dop_data]
-            tdop = [d['tDOP'] for d in self.nav_dop_data]
-            ax.plot(times, pdop, label='PDOP', alpha=0.7)
-            ax.plot(times, tdop, label='TDOP', alpha=0.7)
+            dop_times = _elapsed_s(self.nav_dop_data)
+            ax.plot(dop_times, _column(self.nav_dop_data, 'pDOP'), label='PDOP', alpha=0.7)
+            ax.plot(dop_times, _column(self.nav_dop_data, 'tDOP'), label='TDOP', alpha=0.7)
             ax.set_xlabel('Time (s)')
             ax.set_ylabel('DOP Value')
             ax.set_title('Dilution of Precision')
@@ -432,11 +516,18 @@ class F9TTimingAnalyzer:
         print(f"Plots saved to {output_prefix}_analysis.png")
         plt.close()
     
+    def wall_time(self, timestamp_ns):
+        """Convert message timestamps (scalar or array) to wall-clock datetime64"""
+        return self.start_wall + np.asarray(timestamp_ns).astype('timedelta64[ns]')
+    
     def disconnect(self):
         """Close serial connection"""
         if self.ser and self.ser.is_open:
             self.ser.close()
             print("Disconnected")
+        if self.spool:
+            self._flush_spool()
+            self.spool.close()
 
 
 # Example usage
@@ -447,7 +538,7 @@ if __name__ == "__main__":
     baud = os.getenv("BAUD", 9600          )
     port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
     
-    analyzer = F9TTimingAnalyzer(port, baud)
+    analyzer = F9TTimingAnalyzer(port, baud, spool_path='antenna_test_1_navsat.bin')
     
     if analyzer.connect():
         analyzer.configure_f9t()
@@ -1,22 +1,22 @@
 from serial import Serial
-from pyubx2 import UBXReader, UBXMessage, SET_LAYER_FLASH, SET_LAYER_BBR, TXN_NONE
-import os
+from pyubx2 import UBXMessage, SET_LAYER_FLASH, SET_LAYER_BBR, TXN_NONE
+from ioUtil import envPortBaud, waitForAck
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
+# Deletes every key (0xffffffff wildcard) from the flash and BBR layers
+delete_msg = UBXMessage.config_del(SET_LAYER_FLASH|SET_LAYER_BBR, TXN_NONE, [0xffffffff])
+delete_bytes = delete_msg.serialize()
 
-with Serial(port, baud) as ser:
-    delete_msg = UBXMessage.config_del(SET_LAYER_FLASH|SET_LAYER_BBR, TXN_NONE, [0xffffffff])
-    print(delete_msg)
-    ser.write(delete_msg.serialize())
-    ubr = UBXReader(ser, protfilter=2)
-
-    while True:
-        (raw_data, parsed_data) = ubr.read()
-        print(parsed_data.identity, parsed_data)
-        if parsed_data and parsed_data.identity == 'ACK-ACK':
+def delKeys(port: str, baud: int = 9600) -> bool:
+    # Delete every key from the flash and BBR layers, returns True if ACKed
+    with Serial(port, baud) as ser:
+        print(delete_msg)
+        ser.write(delete_bytes)
+        if waitForAck(ser):
             print("Flash and BBR key delete ACKed")
-            break
-        if parsed_data and parsed_data.identity == 'ACK-NAK':
-            print("Flash and BBR key delete NAKed")
-            break
+            return True
+        print("Flash and BBR key delete NAKed")
+        return False
+
+if __name__ == "__main__":
+    port, baud = envPortBaud()
+    delKeys(port, baud)
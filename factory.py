@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
-from pyubx2 import UBXMessage, UBXReader, SET, TXN_NONE
+from pyubx2 import UBXMessage, SET, TXN_NONE
 import serial
 import sys
-import os
+from ioUtil import envPortBaud, waitForAck
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
+port, baud = envPortBaud()
 
 # N.B. May have to stop gpsd to avoid port conflict
 try:
@@ -28,16 +27,10 @@ clrCfgMsg = UBXMessage(
 print(clrCfgMsg)
 stream.write(clrCfgMsg.serialize())
 
-ubr = UBXReader(stream, protfilter=2)
-while True:
-    (raw_data, parsed_data) = ubr.read()
-    print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'ACK-ACK':
-        print("Non-volatile state cleared")
-        break
-    if parsed_data and parsed_data.identity == 'ACK-NAK':
-        print("Attempt to clear non-volatile state failed")
-        break
+if waitForAck(stream):
+    print("Non-volatile state cleared")
+else:
+    print("Attempt to clear non-volatile state failed")
 
 # Reset with a controlled cold start
 restartMsg = UBXMessage("CFG", "CFG-RST", SET, eph=1, alm=1, health=1, klob=1, pos=1, clkd=1, osc=1, utc=1, rtc=1, aop=1, resetMode=1)
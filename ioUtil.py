@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Serial helpers shared by the config and logging scripts
+from typing import Container, Iterator, Optional, TextIO, Tuple
+from serial import Serial, SerialException
+import select
+import time
+import weakref
+import os
+from pyubx2 import UBXMessage, UBXReader
+from pyubx2.exceptions import UBXMessageError, UBXParseError, UBXTypeError
+from pyubx2.ubxtypes_core import UBX_MSGIDS
+
+# Set DEBUG in the environment to print whole messages rather than just their identities
+DEBUG = bool(os.getenv("DEBUG"))
+
+F9T_PORT = "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00"
+
+UBX_SYNC = b"\xb5\x62"
+UBX_HDR_LEN = 6  # sync, class, id, length
+UBX_CKSUM_LEN = 2
+ACK_ACK_ID = b"\x05\x01"  # Class and id bytes
+ACK_NAK_ID = b"\x05\x00"
+READ_TIMEOUT = 0.05
+READ_SIZE = 4096
+ACK_TIMEOUT = 3.0  # Seconds
+
+# Bytes read from each port but not yet consumed, so a new reader on the same
+# port picks up where the last one stopped
+_unreadByPort: "weakref.WeakKeyDictionary[Serial, bytearray]" = weakref.WeakKeyDictionary()
+
+def _unread(ser: Serial) -> bytearray:
+    return _unreadByPort.setdefault(ser, bytearray())
+
+# Date and time formatted for the last whole second seen by hostClock()
+_lastSec = -1
+_secPrefix = ""
+
+def hostClock() -> str:
+    # Host UTC time as "%Y-%m-%d %H:%M:%S.%f", formatting the date part only when the second changes
+    global _lastSec, _secPrefix
+    sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+    if sec != _lastSec:
+        _secPrefix = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(sec))
+        _lastSec = sec
+    return f"{_secPrefix}.{usec:06d}"
+
+def envPortBaud(defaultPort: str = F9T_PORT, defaultBaud: int = 9600) -> Tuple[str, int]:
+    # Serial port and baud from the PORT and BAUD environment variables
+    return os.getenv("PORT", defaultPort), int(os.getenv("BAUD", defaultBaud))
+
+def setLowLatency(ser: Serial) -> None:
+    # Ask the tty driver to pass bytes up at once instead of on its coalescing timer.
+    # Only Linux pyserial has this, and drivers without TIOCSSERIAL support refuse it.
+    try:
+        ser.set_low_latency_mode(True)
+    except (AttributeError, ValueError):
+        pass
+
+def readChunk(ser: Serial) -> bytes:
+    # Whatever the kernel has as soon as the fd is readable, or b"" after READ_TIMEOUT.
+    # Going straight to the fd skips pyserial's own timeout loop, which delivers bursty on Linux.
+    ready, _, _ = select.select([ser.fd], [], [], READ_TIMEOUT)
+    if not ready:
+        return b""
+    chunk = os.read(ser.fd, READ_SIZE)
+    if not chunk:
+        # Same check pyserial makes: readable with no data means the device went away
+        raise SerialException("device reports readiness to read but returned no data")
+    return chunk
+
+def readLines(ser: Serial) -> Iterator[bytes]:
+    # Yield complete lines, without the trailing newline
+    buf = _unread(ser)
+    while True:
+        end = buf.find(b"\n")
+        if end < 0:
+            buf += readChunk(ser)
+            continue
+        line = bytes(buf[:end])
+        del buf[:end + 1]
+        yield line
+
+def readUbxFrames(ser: Serial, timeout: Optional[float] = None) -> Iterator[bytes]:
+    # Yield raw UBX frames as they complete. NMEA and other bytes between frames
+    # are dropped a chunk at a time, and each frame is sliced by its length field
+    # rather than read a byte at a time. With a timeout, raises TimeoutError once
+    # that many seconds pass while waiting for more bytes.
+    buf = _unread(ser)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        start = buf.find(UBX_SYNC)
+        if start < 0:
+            del buf[:-1]  # Keep a trailing 0xB5 in case its 0x62 is in the next chunk
+        else:
+            del buf[:start]
+            if len(buf) >= UBX_HDR_LEN:
+                frameLen = UBX_HDR_LEN + int.from_bytes(buf[4:6], "little") + UBX_CKSUM_LEN
+                if len(buf) >= frameLen:
+                    frame = bytes(buf[:frameLen])
+                    del buf[:frameLen]
+                    yield frame
+                    continue
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"No UBX response within {timeout} s")
+        buf += readChunk(ser)
+
+def readUbxMessages(ser: Serial, timeout: Optional[float] = None,
+                    msgIds: Optional[Container[bytes]] = None) -> Iterator[UBXMessage]:
+    # Yield parsed UBX messages, skipping frames pyubx2 can't parse. msgIds limits
+    # parsing to frames whose class and id bytes, e.g. b"\x0d\x01" for TIM-TP, are in it.
+    for frame in readUbxFrames(ser, timeout):
+        if msgIds is not None and frame[2:4] not in msgIds:
+            continue
+        try:
+            yield UBXReader.parse(frame)
+        except (UBXMessageError, UBXParseError, UBXTypeError):
+            continue  # Bad checksum or a message pyubx2 doesn't know
+
+class PeriodicFlusher:
+    # Flushes a stream every maxRows rows or maxAge seconds, whichever comes first,
+    # instead of once per row
+    def __init__(self, stream: TextIO, maxRows: int = 10, maxAge: float = 1.0):
+        self.stream = stream
+        self.maxRows = maxRows
+        self.maxAge = maxAge
+        self.rows = 0
+        self.lastFlush = time.monotonic()
+
+    def rowWritten(self) -> None:
+        self.rows += 1
+        now = time.monotonic()
+        if self.rows >= self.maxRows or now - self.lastFlush >= self.maxAge:
+            self.stream.flush()
+            self.rows = 0
+            self.lastFlush = now
+
+def checksumOk(frame: bytes) -> bool:
+    # 8-bit Fletcher over class, id, length and payload
+    ckA = ckB = 0
+    for b in frame[2:-UBX_CKSUM_LEN]:
+        ckA = (ckA + b) & 0xFF
+        ckB = (ckB + ckA) & 0xFF
+    return frame[-2] == ckA and frame[-1] == ckB
+
+def waitForAck(ser: Serial, timeout: float = ACK_TIMEOUT) -> bool:
+    # Print each UBX message until an ACK-ACK (True) or ACK-NAK (False) arrives, raising
+    # TimeoutError if neither does within timeout seconds. Frames are recognized by their
+    # class and id bytes, so only DEBUG output parses them.
+    for frame in readUbxFrames(ser, timeout):
+        msgId = frame[2:4]
+        isAck = msgId == ACK_ACK_ID or msgId == ACK_NAK_ID
+        if isAck and not checksumOk(frame):
+            continue  # Only ACKs are worth summing; the other frames are just printed
+        if DEBUG:
+            try:
+                parsed = UBXReader.parse(frame)
+                print(parsed.identity, parsed)
+            except (UBXMessageError, UBXParseError, UBXTypeError):
+                pass
+        elif msgId in UBX_MSGIDS:
+            print(UBX_MSGIDS[msgId])
+        if isAck:
+            return msgId == ACK_ACK_ID
+    return False
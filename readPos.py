@@ -1,52 +1,95 @@
 #!/usr/bin/env python3
 from typing import Tuple
 import serial
-from pyubx2 import UBXReader, UBXMessage, POLL
+from pyubx2 import UBXMessage, POLL
+from ioUtil import envPortBaud, readUbxMessages, setLowLatency
 import math
+import numpy as np
+from numpy.typing import NDArray
 
-def pollTmode3(port: str, baud: int = 115200, timeout: float = 1.5) -> UBXMessage:
-    with serial.Serial(port, baudrate=baud, timeout=timeout) as ser:
-        # Build and send UBX-CFG-TMODE3 poll (no payload)
-        msg = UBXMessage("CFG", "CFG-TMODE3", POLL)
-        ser.write(msg.serialize())
-        ubr = UBXReader(ser, protfilter=2)  # UBX only
-        while True:
-            raw, parsed = ubr.read()
-            if parsed is None:
-                raise TimeoutError("No UBX response")
-            if parsed.identity == "CFG-TMODE3":
-                return parsed
+# UBX-CFG-TMODE3 poll (no payload), serialized once
+TMODE3_POLL = UBXMessage("CFG", "CFG-TMODE3", POLL).serialize()
+
+def pollTmode3(ser: serial.Serial, timeout: float = 1.5) -> UBXMessage:
+    # Poll CFG-TMODE3 on an already open port, so callers polling more than once keep one session
+    ser.write(TMODE3_POLL)
+    for parsed in readUbxMessages(ser, timeout):
+        if parsed.identity == "CFG-TMODE3":
+            return parsed
+    raise TimeoutError("No UBX response")
+
+# WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+WGS84_E2 = WGS84_F * (2.0 - WGS84_F)
+WGS84_E4 = WGS84_E2 * WGS84_E2
+WGS84_A2 = WGS84_A * WGS84_A
+# Derived terms of the closed form below, so each call only does the per-point work
+WGS84_INV_A2 = 1.0 / WGS84_A2
+WGS84_Q_SCALE = (1.0 - WGS84_E2) / WGS84_A2
+WGS84_E2_M1 = WGS84_E2 - 1.0
 
 def ecefToLlh(xm: float, ym: float, zm: float) -> Tuple[float, float, float]:
-    # WGS-84
-    a = 6378137.0
-    f = 1.0 / 298.257223563
-    e2 = f * (2.0 - f)
+    # Closed form from Vermeille, "An analytical method to transform geocentric
+    # into geodetic coordinates", J. Geodesy 2011. No iteration; valid anywhere
+    # outside the small region around the Earth's centre.
+    if isinstance(xm, np.ndarray):
+        return ecefToLlhBatch(xm, ym, zm)  # type: ignore[return-value]
     lon = math.atan2(ym, xm)
-    p = math.hypot(xm, ym)
-    lat = math.atan2(zm, p * (1.0 - e2))
-    for _ in range(5):
-        sinLat = math.sin(lat)
-        n = a / math.sqrt(1.0 - e2 * sinLat * sinLat)
-        lat = math.atan2(zm + e2 * n * sinLat, p)
-    alt = p / math.cos(lat) - n
+    p2 = xm * xm + ym * ym
+    p = p2 * WGS84_INV_A2
+    q = WGS84_Q_SCALE * zm * zm
+    r = (p + q - WGS84_E4) / 6.0
+    s = WGS84_E4 * p * q / (4.0 * r * r * r)
+    t = (1.0 + s + math.sqrt(s * (2.0 + s))) ** (1.0 / 3.0)
+    u = r * (1.0 + t + 1.0 / t)
+    v = math.sqrt(u * u + WGS84_E4 * q)
+    w = WGS84_E2 * (u + v - q) / (2.0 * v)
+    k = math.sqrt(u + v + w * w) - w
+    d = k * math.sqrt(p2) / (k + WGS84_E2)
+    dz = math.hypot(d, zm)
+    lat = 2.0 * math.atan2(zm, d + dz)
+    alt = (k + WGS84_E2_M1) / k * dz
     return math.degrees(lat), math.degrees(lon), alt
 
-def readFixedPosition(port: str) -> Tuple[float, float, float]:
-    tm = pollTmode3(port)
+def ecefToLlhBatch(xm: NDArray[np.float64], ym: NDArray[np.float64], zm: NDArray[np.float64]
+                   ) -> Tuple[NDArray[np.float64], NDArray[np.float64], NDArray[np.float64]]:
+    # ecefToLlh over arrays of fixes, e.g. when replaying a log
+    xm, ym, zm = np.asarray(xm, np.float64), np.asarray(ym, np.float64), np.asarray(zm, np.float64)
+    lon = np.arctan2(ym, xm)
+    p2 = xm * xm + ym * ym
+    p = p2 * WGS84_INV_A2
+    q = WGS84_Q_SCALE * zm * zm
+    r = (p + q - WGS84_E4) / 6.0
+    s = WGS84_E4 * p * q / (4.0 * r * r * r)
+    t = np.cbrt(1.0 + s + np.sqrt(s * (2.0 + s)))
+    u = r * (1.0 + t + 1.0 / t)
+    v = np.sqrt(u * u + WGS84_E4 * q)
+    w = WGS84_E2 * (u + v - q) / (2.0 * v)
+    k = np.sqrt(u + v + w * w) - w
+    d = k * np.sqrt(p2) / (k + WGS84_E2)
+    dz = np.hypot(d, zm)
+    lat = 2.0 * np.arctan2(zm, d + dz)
+    alt = (k + WGS84_E2_M1) / k * dz
+    return np.degrees(lat), np.degrees(lon), alt
+
+def hpToMeters(baseCm: NDArray[np.int64], hp01mm: NDArray[np.int64]) -> NDArray[np.float64]:
+    # F9T: ecefX/Y/Z are in centimeters; ecefHP in 0.1 mm (sign extends).
+    # Takes arrays, so a log replay can convert every stored fix in one call.
+    return baseCm / 100.0 + hp01mm / 10_000.0
+
+def readFixedPosition(port: str, baud: int = 115200) -> Tuple[float, float, float]:
+    with serial.Serial(port, baudrate=baud) as ser:
+        setLowLatency(ser)
+        tm = pollTmode3(ser)
     print(tm)
     if tm.rcvrMode != 2:
         raise RuntimeError(f"Receiver not in fixed mode (mode={tm.rcvrMode})")
-    # F9T: ecefX/Y/Z are in centimeters; ecefHP in 0.1 mm (sign extends)
-    def hpToMeters(baseCm: int, hp01mm: int) -> float:
-        # high-precision is signed int8 in 0.1 mm
-        hpMeters = (hp01mm / 10_000.0)
-        return baseCm / 100.0 + hpMeters
-    x = hpToMeters(tm.ecefXOrLat, tm.ecefXOrLatHP)
-    y = hpToMeters(tm.ecefYOrLon, tm.ecefYOrLonHP)
-    z = hpToMeters(tm.ecefZOrAlt, tm.ecefZOrAltHP)
+    # All three axes in one array op
+    x, y, z = hpToMeters(np.array([tm.ecefXOrLat, tm.ecefYOrLon, tm.ecefZOrAlt]),
+                         np.array([tm.ecefXOrLatHP, tm.ecefYOrLonHP, tm.ecefZOrAltHP])).tolist()
     return ecefToLlh(x, y, z)
 
 if __name__ == "__main__":
-    lat, lon, alt = readFixedPosition("/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
+    lat, lon, alt = readFixedPosition(envPortBaud()[0])
     print(f"Fixed LLH: lat={lat:.9f}°, lon={lon:.9f}°, h={alt:.3f} m")
@@ -18,3 +18,18 @@ runData = {
     "f9tM600-2":  {"A": "F9T-PT", "B": "M600-DHQ", "notes": "second run, stabilized"},
     "ctiCns1":    {"A": "CTIocxo", "B": "CNSclockII", "notes": "run 1, CNS jittery"},
 }
+
+# Column views of runData, in the same order as runKeys, for filtering without walking the dicts
+# e.g. [key for key, a in zip(runKeys, runA) if a == "F9T-Bob"]
+runKeys = list(runData)
+runA = [run.get("A") for run in runData.values()]
+runB = [run.get("B") for run in runData.values()]
+runNotes = [run.get("notes") for run in runData.values()]
+
+# The same table indexed by run key, when pandas is around
+# e.g. runDataDf[runDataDf.A.eq("F9T-Bob")]
+try:
+    import pandas as pd
+    runDataDf = pd.DataFrame.from_dict(runData, orient="index")
+except ImportError:
+    runDataDf = None
@@ -1,15 +1,15 @@
 #!/usr/bin/env python3
 from serial import Serial
-from pyubx2 import UBXMessage, UBXReader, val2sphp, SET, SET_LAYER_RAM, TXN_NONE
-import os
+from pyubx2 import UBXMessage, val2sphp, SET, SET_LAYER_RAM, TXN_NONE
+from ioUtil import envPortBaud, waitForAck
+import sys
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
+port, baud = envPortBaud()
 
 
-with Serial(port, baud, timeout=2) as ser:
+def buildSigEnaMsg() -> UBXMessage:
     # Construct CFG-VALSET message
-    sigEnaMsg = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE,
+    return UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE,
         [
         # Enable Only GPS
             ("CFG_SIGNAL_BDS_ENA", 0),
@@ -62,16 +62,18 @@ with Serial(port, baud, timeout=2) as ser:
 #            ("CFG_SIGNAL_SBAS_L1CA_ENA", 0),
         ]
     )
-    print(sigEnaMsg)
-    ser.write(sigEnaMsg.serialize())
 
-    ubr = UBXReader(ser, protfilter=2)
-    while True:
-        (raw_data, parsed_data) = ubr.read()
-        print(parsed_data.identity, parsed_data)
-        if parsed_data and parsed_data.identity == 'ACK-ACK':
-            print("Signals enabled.")
-            break
-        if parsed_data and parsed_data.identity == 'ACK-NAK':
-            print("Attempt to enable signals failed")
-            break
+# buildSigEnaMsg() serialized; after editing it, run with --generate and paste the output here
+sigEnaBytes = b'\xB5\x62\x06\x8A\x31\x00\x00\x01\x00\x00\x22\x00\x31\x10\x00\x21\x00\x31\x10\x00\x25\x00\x31\x10\x00\x1F\x00\x31\x10\x01\x01\x00\x31\x10\x01\x04\x00\x31\x10\x01\x26\x00\x31\x10\x00\x24\x00\x31\x10\x00\x20\x00\x31\x10\x00\x04\xF5'
+
+if sys.argv[1:] == ["--generate"]:
+    print("b'" + "".join(f"\\x{b:02X}" for b in buildSigEnaMsg().serialize()) + "'")
+    sys.exit(0)
+
+with Serial(port, baud, timeout=2) as ser:
+    ser.write(sigEnaBytes)
+
+    if waitForAck(ser):
+        print("Signals enabled.")
+    else:
+        print("Attempt to enable signals failed")
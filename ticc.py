@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import serial
-from datetime import datetime
 import csv
 import sys
+import atexit
+from ioUtil import PeriodicFlusher, hostClock, readLines, setLowLatency
 
 if len(sys.argv) != 2:
     print(f"Usage: {sys.argv[0]} <pathname>")
@@ -15,27 +16,31 @@ try:
 except SerialException as e:
     print(f"Failed to open serial port: {e}")
     sys.exit(1)
+setLowLatency(stream)
 
-chA = csv.writer(open(f"{pathname}.ticcA.csv", "w"))
-chB = csv.writer(open(f"{pathname}.ticcB.csv", "w"))
+# 64 KB buffers so rows reach the disk in large writes; flushed at exit for the tail
+chAFile = open(f"{pathname}.ticcA.csv", "w", buffering=1 << 16, newline='')
+chBFile = open(f"{pathname}.ticcB.csv", "w", buffering=1 << 16, newline='')
+atexit.register(chAFile.flush)
+atexit.register(chBFile.flush)
+chA = csv.writer(chAFile)
+chB = csv.writer(chBFile)
 
 chA.writerow(["ppsHostClock", "ppsRefClock"])
 chB.writerow(["ppsHostClock", "ppsRefClock"])
-while True:
-    line = stream.readline().decode('utf-8', errors='ignore').strip()
-    if line.endswith("chA"):
-        ref = line[:-4]
-        if len(ref)>12 and '.' in ref:
-            ts = datetime.utcnow()
-            tss = ts.strftime("%Y-%m-%d %H:%M:%S.%f")#[:-3]
-            chA.writerow([tss, line[:-4]])
-            print(line)
-            sys.stdout.flush()
-    if line.endswith("chB"):
-        ref = line[:-4]
-        if len(ref)>12 and '.' in ref:
-            ts = datetime.utcnow()
-            tss = ts.strftime("%Y-%m-%d %H:%M:%S.%f")#[:-3]
-            chB.writerow([tss, line[:-4]])
-            print(line)
-            sys.stdout.flush()
+# Echoed lines go out in batches, so don't let a tty flush every line either
+sys.stdout.reconfigure(line_buffering=False)
+flusher = PeriodicFlusher(sys.stdout)
+# Lines look like "<ref seconds> chA"; look up the writer by the channel suffix
+writeRowByChannel = {"chA": chA.writerow, "chB": chB.writerow}
+for rawLine in readLines(stream):
+    line = rawLine.decode('utf-8', errors='ignore').strip()
+    writeRow = writeRowByChannel.get(line[-3:])
+    if writeRow is None or len(line) <= 16:  # ref must be over 12 chars
+        continue
+    ref = line[:-4]
+    if '.' in ref:
+        tss = hostClock()
+        writeRow([tss, ref])
+        print(line)
+        flusher.rowWritten()
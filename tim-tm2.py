@@ -1,12 +1,10 @@
-from pyubx2 import UBXMessage, UBXReader, SET, SET_LAYER_RAM, TXN_NONE
+from pyubx2 import UBXMessage, SET, SET_LAYER_RAM, TXN_NONE
 import serial
-from datetime import datetime
 import csv
 import sys
-import os
+from ioUtil import envPortBaud, PeriodicFlusher, hostClock, readUbxMessages, setLowLatency, waitForAck
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
+port, baud = envPortBaud()
 
 # N.B. May have to stop gpsd to avoid port conflict
 try:
@@ -14,8 +12,7 @@ try:
 except SerialException as e:
     print(f"Failed to open serial port: {e}")
     sys.exit(1)
-
-ubr = UBXReader(stream)
+setLowLatency(stream)
 
 # XXX Should figure out how to get constants for this from pyubx2
 # UBX-TIM-TP has class 0x0D (TIM), ID 0x01 (TP)
@@ -28,12 +25,10 @@ cfgTimTp = UBXMessage('CFG', 'CFG-MSG', SET,
 )
 stream.write(cfgTimTp.serialize())
 
-while True:
-    (raw_data, parsed_data) = ubr.read()
-    print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'ACK-ACK':
-        break
-print("TIM-TP configured")
+if waitForAck(stream):
+    print("TIM-TP configured")
+else:
+    print("Attempt to configure TIM-TP failed")
 
 # XXX Should figure out how to get constants for this from pyubx2
 # UBX-TIM-TM2 has class 0x0D (TIM), ID 0x03 (TM2)
@@ -46,32 +41,40 @@ cfgTimTm2 = UBXMessage('CFG', 'CFG-MSG', SET,
 )
 stream.write(cfgTimTm2.serialize())
 
-while True:
-    (raw_data, parsed_data) = ubr.read()
-    print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'ACK-ACK':
-        break
-print("TIM-TM2 configured")
+if waitForAck(stream):
+    print("TIM-TM2 configured")
+else:
+    print("Attempt to configure TIM-TM2 failed")
 
 cfgData = [("CFG_TP_TIMEGRID_TP1", 0)] # TP1 = UTC
 cfgTimeBaseUtc = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, cfgData)
 
 stream.write(cfgTimeBaseUtc.serialize())
 
+# Rows go out in batches, so don't let a tty flush every line either
+sys.stdout.reconfigure(line_buffering=False)
 csvwr = csv.writer(sys.stdout)
+flusher = PeriodicFlusher(sys.stdout)
+
+# Per-message handlers, looked up by pyubx2 identity
+def handleTp(tp):
+    tss = hostClock()
+#    print(tp.identity, tp)
+    csvwr.writerow([tss, tp.week, tp.towMS, tp.towSubMS, tp.qErr, tp.timeBase, tp.utc, tp.raim, tp.qErrInvalid, tp.TpNotLocked, tp.timeRefGnss, tp.utcStandard])
+    flusher.rowWritten()
+
+def handleTm2(tm2):
+    print(tm2.identity, tm2)
+
+handlerByIdentity = {'TIM-TP': handleTp, 'TIM-TM2': handleTm2}
+# Class and id bytes of the handled messages, so nothing else gets parsed
+handledMsgIds = {b"\x0d\x01", b"\x0d\x03"}
 
 csvwr.writerow(["hostClock", "week", "towMS", "towSubMS", "qErr", "timeBase", "utc", "raim", "qErrInvalid", "TpNotLocked", "timeRefGnss", "utcStandard"])
-while True:
-    (raw_data, parsed_data) = ubr.read()
+for parsed_data in readUbxMessages(stream, msgIds=handledMsgIds):
 #    print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'TIM-TM2':
-        print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'TIM-TP':
-        ts = datetime.utcnow()
-        tss = ts.strftime("%Y-%m-%d %H:%M:%S.%f")#[:-3]
-        tp = parsed_data
-#        print(tp.identity, tp)
-        csvwr.writerow([tss, tp.week, tp.towMS, tp.towSubMS, tp.qErr, tp.timeBase, tp.utc, tp.raim, tp.qErrInvalid, tp.TpNotLocked, tp.timeRefGnss, tp.utcStandard])
-        sys.stdout.flush()
+    handler = handlerByIdentity.get(parsed_data.identity)
+    if handler:
+        handler(parsed_data)
 #    if parsed_data.identity in ("NAV-PVT", "NAV-TIMEGPS", "NAV-TIMEUTC", "TIM-TP", "TIM-TM2", "RXM-RAWX"):
 #        print(f"{parsed_data.identity}: {parsed_data}", flush=True)
@@ -1,14 +1,12 @@
 #!/usr/bin/env python3
-from pyubx2 import UBXMessage, UBXReader, SET, SET_LAYER_RAM, TXN_NONE
+from pyubx2 import UBXMessage, SET, SET_LAYER_RAM, TXN_NONE
 import serial
 from serial import SerialException
-from datetime import datetime
 import csv
 import sys
-import os
+from ioUtil import envPortBaud, PeriodicFlusher, hostClock, readUbxMessages, setLowLatency
 
-port = os.getenv("PORT", "/dev/serial/by-id/usb-u-blox_AG_-_www.u-blox.com_u-blox_GNSS_receiver-if00")
-baud = os.getenv("BAUD", 9600          )
+port, baud = envPortBaud()
 
 # N.B. May have to stop gpsd to avoid port conflict
 try:
@@ -16,6 +14,7 @@ try:
 except SerialException as e:
     print(f"Failed to open serial port: {e}")
     sys.exit(1)
+setLowLatency(stream)
 
 # UBX-TIM-TP has class 0x0D (TIM), ID 0x01 (TP)
 # Arguments: msgClass, msgID, rates for each target port (UART1, UART2, USB, SPI, I2C)
@@ -42,20 +41,27 @@ cfgTimeBaseUtc = UBXMessage.config_set(SET_LAYER_RAM, TXN_NONE, cfgData)
 
 stream.write(cfgTimeBaseUtc.serialize())
 
-ubr = UBXReader(stream)
-
+# Rows go out in batches, so don't let a tty flush every line either
+sys.stdout.reconfigure(line_buffering=False)
 csvwr = csv.writer(sys.stdout)
+flusher = PeriodicFlusher(sys.stdout)
+
+# Per-message handlers, looked up by pyubx2 identity
+def handleTp(tp):
+    tss = hostClock()
+#    print(tp.identity, tp)
+    csvwr.writerow([tss, tp.week, tp.towMS, tp.towSubMS, tp.qErr, tp.timeBase, tp.utc, tp.raim, tp.qErrInvalid, tp.TpNotLocked, tp.timeRefGnss, tp.utcStandard])
+    flusher.rowWritten()
+
+handlerByIdentity = {'TIM-TP': handleTp}
+# Class and id bytes of the handled messages, so nothing else gets parsed
+handledMsgIds = {b"\x0d\x01"}
 
 csvwr.writerow(["hostClock", "week", "towMS", "towSubMS", "qErr", "timeBase", "utc", "raim", "qErrInvalid", "TpNotLocked", "timeRefGnss", "utcStandard"])
-while True:
-    (raw_data, parsed_data) = ubr.read()
+for parsed_data in readUbxMessages(stream, msgIds=handledMsgIds):
 #    print(parsed_data.identity, parsed_data)
-    if parsed_data and parsed_data.identity == 'TIM-TP':
-        ts = datetime.utcnow()
-        tss = ts.strftime("%Y-%m-%d %H:%M:%S.%f")#[:-3]
-        tp = parsed_data
-#        print(tp.identity, tp)
-        csvwr.writerow([tss, tp.week, tp.towMS, tp.towSubMS, tp.qErr, tp.timeBase, tp.utc, tp.raim, tp.qErrInvalid, tp.TpNotLocked, tp.timeRefGnss, tp.utcStandard])
-        sys.stdout.flush()
+    handler = handlerByIdentity.get(parsed_data.identity)
+    if handler:
+        handler(parsed_data)
 #    if parsed_data.identity in ("NAV-PVT", "NAV-TIMEGPS", "NAV-TIMEUTC", "TIM-TP", "TIM-TM2", "RXM-RAWX"):
 #        print(f"{parsed_data.identity}: {parsed_data}", flush=True)